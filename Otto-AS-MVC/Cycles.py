@@ -0,0 +1,245 @@
+"""
+Air standard cycles on the variable specific heat air model of Air.py.
+
+A cycle is declared as a list of processes, each of one kind:
+    isentropic:  s is constant
+    isochoric:   v is constant
+    isobaric:    P is constant
+    polytropic:  P*v**n is constant
+Each process starts where the one before it ended and runs until one property reaches the value given by its end
+condition.  The last process has no end condition and closes the cycle at state 1.  Adding a cycle means adding a
+cycleDefinition to cycles, e.g., the Diesel cycle is:
+    cycleDefinition('Diesel', ('ratio', 'rc'), (
+        process('isentropic', ('v', lambda st, x: st[0].v/x['ratio']), name='compression'),
+        process('isobaric', ('v', lambda st, x: st[1].v*x['rc']), name='heat addition'),
+        process('isentropic', ('v', lambda st, x: st[0].v), name='power stroke'),
+        process('isochoric', name='heat rejection')))
+calcCycle evaluates a cycle for whole arrays of inputs at once:  every process is one air.set_many call for its end
+states and one for the points along its path, whatever the number of cycles.
+States and energies are molar in SI units (K, Pa, J/mol, J/mol*K, m^3/mol), as in ottoCycleModel.
+"""
+from Air import *
+from Instrument import probe
+from collections import namedtuple
+import numpy as np
+
+class process(namedtuple('process', ('kind', 'end', 'n', 'name'), defaults=(None, None, None))):
+    """
+    One process of a cycle.
+    kind: 'isentropic', 'isochoric', 'isobaric' or 'polytropic'
+    end: (property, function(states, inputs)) where the function returns the value of the property ('T', 'P' or
+         'v') at the end of the process from the states so far (a list of StateArray, state 1 first) and the inputs
+         (a dictionary of arrays).  None closes the cycle at state 1.
+    n: the polytropic exponent (a number or the name of an input), only for 'polytropic'
+    name: a convenient name
+    """
+    __slots__ = ()
+    kinds = ('isentropic', 'isochoric', 'isobaric', 'polytropic')
+
+class cycleDefinition(namedtuple('cycleDefinition', ('name', 'inputs', 'processes'))):
+    """
+    name: name of the cycle
+    inputs: names of the inputs besides T_0 and P_0 (the state at the start of process 1)
+    processes: tuple of process in order, the last one closing the cycle
+    """
+    __slots__ = ()
+
+cycles = {
+    # 1-2 compression, 2-3 heat added at constant volume up to T_High, 3-4 expansion back to v1, 4-1 heat rejected
+    'Otto': cycleDefinition('Otto', ('ratio', 'T_High'), (
+        process('isentropic', ('v', lambda st, x: st[0].v/x['ratio']), name='compression'),
+        process('isochoric', ('T', lambda st, x: x['T_High']), name='heat addition'),
+        process('isentropic', ('v', lambda st, x: st[0].v), name='power stroke'),
+        process('isochoric', name='heat rejection'))),
+    # heat is added at constant pressure until the volume has grown by the cutoff ratio, rc
+    'Diesel': cycleDefinition('Diesel', ('ratio', 'rc'), (
+        process('isentropic', ('v', lambda st, x: st[0].v/x['ratio']), name='compression'),
+        process('isobaric', ('v', lambda st, x: st[1].v*x['rc']), name='heat addition'),
+        process('isentropic', ('v', lambda st, x: st[0].v), name='power stroke'),
+        process('isochoric', name='heat rejection'))),
+    # heat is added at constant volume until the pressure has grown by rp and then at constant pressure for rc
+    'Dual': cycleDefinition('Dual', ('ratio', 'rp', 'rc'), (
+        process('isentropic', ('v', lambda st, x: st[0].v/x['ratio']), name='compression'),
+        process('isochoric', ('P', lambda st, x: st[1].P*x['rp']), name='heat addition (v)'),
+        process('isobaric', ('v', lambda st, x: st[2].v*x['rc']), name='heat addition (P)'),
+        process('isentropic', ('v', lambda st, x: st[0].v), name='power stroke'),
+        process('isochoric', name='heat rejection'))),
+    # like the Otto cycle, but the expansion goes all the way down to P1 and heat is rejected at constant pressure
+    'Atkinson': cycleDefinition('Atkinson', ('ratio', 'T_High'), (
+        process('isentropic', ('v', lambda st, x: st[0].v/x['ratio']), name='compression'),
+        process('isochoric', ('T', lambda st, x: x['T_High']), name='heat addition'),
+        process('isentropic', ('P', lambda st, x: st[0].P), name='power stroke'),
+        process('isobaric', name='heat rejection'))),
+    # gas turbine:  compression by the pressure ratio rp, heat added at constant pressure up to T_High
+    'Brayton': cycleDefinition('Brayton', ('rp', 'T_High'), (
+        process('isentropic', ('P', lambda st, x: st[0].P*x['rp']), name='compression'),
+        process('isobaric', ('T', lambda st, x: x['T_High']), name='heat addition'),
+        process('isentropic', ('P', lambda st, x: st[0].P), name='expansion'),
+        process('isobaric', name='heat rejection'))),
+}
+
+class cycleResults():
+    """
+    Results of calcCycle.  Every array has the broadcast shape of the inputs, except the paths, which have an extra
+    last axis for the points along the process.
+    states:  list of StateArray, state 1 first
+    Q, W:  arrays of shape (number of processes,)+shape with the heat added to and work done by the air in each
+           process (J/mol)
+    Q_In, Q_Out, W_Cycle, Eff:  heat added, heat rejected, net work (J/mol) and efficiency (%)
+    paths:  list of StateArray with the states along each process, from its start to its end
+    """
+    def __init__(self, definition, states, Q, W, paths):
+        self.definition = definition
+        self.name = definition.name
+        self.states = states
+        self.Q = Q
+        self.W = W
+        self.paths = paths
+        self.Q_In = np.where(Q > 0.0, Q, 0.0).sum(axis=0)
+        self.Q_Out = -np.where(Q < 0.0, Q, 0.0).sum(axis=0)
+        self.W_Cycle = W.sum(axis=0)
+        self.Eff = 100.0*self.W_Cycle/self.Q_In
+
+    @property
+    def shape(self):
+        return self.W_Cycle.shape
+
+    def getState(self, i):
+        # returns state i (1 based) of every cycle as a StateArray
+        return self.states[i-1]
+
+    def getPath(self, W='T'):
+        """
+        The points of the whole cycle for one property, in order around the cycle starting from state 1.
+        :return: array of shape shape+(number of points,)
+        """
+        return np.concatenate([path.getVal(W) for path in self.paths], axis=-1)
+
+def endState(Air, kind, start, prop, val, n=None):
+    """
+    The state at the end of a process.
+    :param Air: the air object to use
+    :param kind: kind of process
+    :param start: StateArray at the start of the process
+    :param prop: property given at the end ('T', 'P' or 'v')
+    :param val: value(s) of that property at the end
+    :param n: polytropic exponent
+    :return: StateArray
+    """
+    if kind == 'isentropic':
+        return Air.set_many(s=start.s, **{prop: val})
+    if kind == 'isochoric':
+        return Air.set_many(v=start.v, **{prop: val})
+    if kind == 'isobaric':
+        return Air.set_many(P=start.P, **{prop: val})
+    # polytropic:  P*v**n=const, and T from P*v=Rbar*T when T is given
+    if prop == 'v':
+        return Air.set_many(v=val, P=start.P*(start.v/val)**n)
+    if prop == 'P':
+        return Air.set_many(P=val, v=start.v*(start.P/val)**(1.0/n))
+    # T*v**(n-1)=const
+    return Air.set_many(T=val, v=start.v*(start.T/val)**(1.0/(n-1.0)))
+
+def pathStates(Air, kind, start, end, t, n=None):
+    """
+    States along a process for the fractions t (0 at the start, 1 at the end).  The constant volume and constant
+    pressure processes step evenly in T, and the others step evenly in log(v).
+    :return: StateArray with the shape of start plus the length of t
+    """
+    a = lambda x: np.asarray(x)[..., None]
+    if kind in ('isochoric', 'isobaric'):
+        T = a(start.T)+t*(a(end.T)-a(start.T))
+        return Air.set_many(T=T, v=a(start.v)) if kind == 'isochoric' else Air.set_many(T=T, P=a(start.P))
+    v = a(start.v)*(a(end.v)/a(start.v))**t
+    if kind == 'isentropic':
+        return Air.set_many(v=v, s=a(start.s))
+    return Air.set_many(v=v, P=a(start.P)*(a(start.v)/v)**a(n))
+
+def processEnergy(Air, kind, start, end, n=None):
+    """
+    Heat added to and work done by one mole of air in a process (first law:  q-w=u2-u1).
+    :return: (q, w) in J/mol
+    """
+    du = end.u-start.u
+    if kind == 'isentropic':
+        return np.zeros_like(du), -du
+    if kind == 'isochoric':
+        return du, np.zeros_like(du)
+    if kind == 'isobaric':
+        w = start.P*(end.v-start.v)
+        return end.h-start.h, w
+    # polytropic:  w=(P2*v2-P1*v1)/(1-n), or Rbar*T*ln(v2/v1) for n=1
+    n = np.broadcast_to(n, du.shape)
+    isothermal = np.isclose(n, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = np.where(isothermal, Air.RBar*start.T*np.log(end.v/start.v),
+                     (end.P*end.v-start.P*start.v)/(1.0-n))
+    return du+w, w
+
+def calcCycle(cycle, T_0, P_0, Air=None, nPoints=30, **inputs):
+    """
+    Evaluates a cycle for arrays of inputs.  All the inputs broadcast together, so e.g. ratio=np.linspace(4, 16, 25)
+    and T_High=np.linspace(1200, 3000, 37)[:, None] gives a 37x25 grid of cycles.
+    :param cycle: name of a cycle in cycles or a cycleDefinition
+    :param T_0: temperature at state 1 in K
+    :param P_0: pressure at state 1 in Pa
+    :param Air: the air object to use (a new one if None)
+    :param nPoints: points along each process in the paths (0 for no paths)
+    :param inputs: the inputs the cycle needs (see cycleDefinition.inputs) in SI units
+    :return: cycleResults
+    """
+    definition = cycles[cycle] if isinstance(cycle, str) else cycle
+    missing = [name for name in definition.inputs if name not in inputs]
+    if missing:
+        raise ValueError('the {} cycle needs input(s): {}'.format(definition.name, ', '.join(missing)))
+    Air = air() if Air is None else Air
+    vals = np.broadcast_arrays(*[np.asarray(val, dtype=float) for val in (T_0, P_0)+tuple(inputs.values())])
+    T_0, P_0 = vals[:2]
+    inputs = dict(zip(inputs, vals[2:]))
+    t = np.linspace(0.0, 1.0, nPoints)
+
+    states = [Air.set_many(P=P_0, T=T_0, name='State 1')]
+    Q = np.empty((len(definition.processes),)+T_0.shape)
+    W = np.empty_like(Q)
+    paths = []
+    for i, p in enumerate(definition.processes):
+        if p.kind not in process.kinds:
+            raise ValueError('unknown kind of process: {}'.format(p.kind))
+        n = None
+        if p.kind == 'polytropic':
+            n = inputs[p.n] if isinstance(p.n, str) else np.asarray(p.n, dtype=float)
+        with probe.span('{} {}'.format(definition.name, p.name or p.kind), cat='cycle'):
+            start = states[-1]
+            if p.end is None:
+                end = states[0]  # back to state 1
+            else:
+                prop, fn = p.end
+                end = endState(Air, p.kind, start, prop, fn(states, inputs), n)
+                end.name = 'State {}'.format(len(states)+1)
+                states.append(end)
+            Q[i], W[i] = processEnergy(Air, p.kind, start, end, n)
+            if nPoints:
+                paths.append(pathStates(Air, p.kind, start, end, t, n))
+    return cycleResults(definition, states, Q, W, paths)
+
+def main():
+    # compares the cycles at about the same conditions
+    T_0, P_0 = 300.0, 1.0E5
+    runs = (('Otto', dict(ratio=8.0, T_High=2000.0)),
+            ('Diesel', dict(ratio=18.0, rc=2.0)),
+            ('Dual', dict(ratio=14.0, rp=1.5, rc=1.6)),
+            ('Atkinson', dict(ratio=8.0, T_High=2000.0)),
+            ('Brayton', dict(rp=12.0, T_High=1500.0)))
+    print('{:10s} {:>10s} {:>12s} {:>12s} {:>8s}'.format('cycle', 'T max (K)', 'Q in (J/mol)', 'W (J/mol)', 'eff (%)'))
+    for name, inputs in runs:
+        res = calcCycle(name, T_0, P_0, **inputs)
+        TMax = max(float(st.T) for st in res.states)
+        print('{:10s} {:10.1f} {:12.1f} {:12.1f} {:8.2f}'.format(name, TMax, float(res.Q_In), float(res.W_Cycle),
+                                                                  float(res.Eff)))
+    res = calcCycle('Otto', T_0, P_0, ratio=np.linspace(4.0, 16.0, 7), T_High=np.linspace(1200.0, 3000.0, 4)[:, None])
+    print('\nOtto efficiency (%), T_High down, ratio across')
+    for TH, effs in zip(np.linspace(1200.0, 3000.0, 4), res.Eff):
+        print('{:7.0f} '.format(TH) + ''.join('{:8.2f}'.format(e) for e in effs))
+
+if __name__ == '__main__':
+    main()
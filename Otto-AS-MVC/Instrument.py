@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+
+class nullSpan():
+    # what instrumentation.span hands out while it is turned off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class span():
+    """
+    Times a block of code (use with a with statement) and records it as a Chrome trace complete event.
+    While it is open, counts are charged to its case (if it has one).
+    """
+    def __init__(self, probe, name, cat, case):
+        self.probe = probe
+        self.name = name
+        self.cat = cat
+        self.case = case
+
+    def __enter__(self):
+        local = self.probe.local
+        self.outerCase = getattr(local, 'case', None)
+        if self.case is not None:
+            local.case = self.case
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.probe.local.case = self.outerCase
+        self.probe.addSpan(self.name, self.cat, self.case, self.start, end)
+        return False
+
+class instrumentation():
+    """
+    Opt-in counters and timers for the hot paths of Air.py and Otto.py.  It is off until enable() is called, and
+    while it is off the instrumented code only checks probe.enabled (or gets a shared do-nothing span), so the
+    overhead is a few attribute lookups per call.
+    Counts are kept per case:  the name of the innermost open span that has one (e.g., 'air.set(P,s)').
+    Usage:
+        from Instrument import probe
+        probe.enable()
+        ... calculate ...
+        print(probe.summary())
+        probe.saveTrace('trace.json')  # open with chrome://tracing or https://ui.perfetto.dev
+    """
+    def __init__(self):
+        self.enabled = False
+        self.local = threading.local()  # the current case of each thread
+        self.lock = threading.Lock()
+        self.null = nullSpan()
+        self.reset()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        # forgets everything recorded so far
+        with self.lock:
+            self.counts = {}  # (case, name): count
+            self.spans = {}  # (name, case): [calls, total seconds]
+            self.events = []  # Chrome trace events
+            self.t0 = time.perf_counter()
+
+    def count(self, name, n=1):
+        """
+        Adds n to a counter for the current case.  Callers check probe.enabled first so nothing is done while it
+        is off.
+        """
+        key = (getattr(self.local, 'case', None), name)
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + n
+
+    def span(self, name, cat='', case=None):
+        """
+        :param name: name of the timed block
+        :param cat: category for the trace viewer (e.g., 'air' or 'otto')
+        :param case: if given, counts made inside the block are charged to this case
+        :return: a context manager that times the block (does nothing if instrumentation is off)
+        """
+        if not self.enabled:
+            return self.null
+        return span(self, name, cat, case)
+
+    def addSpan(self, name, cat, case, start, end):
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': (start-self.t0)*1.0E6, 'dur': (end-start)*1.0E6,
+                 'pid': os.getpid(), 'tid': threading.get_ident()}
+        if case is not None:
+            event['args'] = {'case': case}
+        with self.lock:
+            stats = self.spans.setdefault((name, case), [0, 0.0])
+            stats[0] += 1
+            stats[1] += end-start
+            self.events.append(event)
+
+    def summary(self):
+        """
+        :return: a table of the timed blocks and of the counts for each case (also per call of the case)
+        """
+        lines = ['{:40s} {:>8s} {:>12s} {:>12s}'.format('timer', 'calls', 'total (ms)', 'mean (us)')]
+        calls = {}
+        for (name, case), (n, total) in sorted(self.spans.items(), key=lambda kv: -kv[1][1]):
+            label = name if case is None or case == name else '{} [{}]'.format(name, case)
+            lines.append('{:40s} {:8d} {:12.3f} {:12.1f}'.format(label, n, total*1.0E3, total/n*1.0E6))
+            if case is not None:
+                calls[case] = calls.get(case, 0) + n
+        if self.counts:
+            lines.append('')
+            lines.append('{:40s} {:24s} {:>10s} {:>10s}'.format('case', 'counter', 'count', 'per call'))
+            for (case, name), n in sorted(self.counts.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+                perCall = '{:10.2f}'.format(n/calls[case]) if case in calls else ''
+                lines.append('{:40s} {:24s} {:10d} {:>10s}'.format(str(case), name, n, perCall))
+        return '\n'.join(lines)
+
+    def trace(self):
+        # the recorded spans and final counts in Chrome trace event format
+        with self.lock:
+            events = list(self.events)
+            end = (time.perf_counter()-self.t0)*1.0E6
+            for (case, name), n in self.counts.items():
+                events.append({'name': '{} [{}]'.format(name, case), 'ph': 'C', 'ts': end, 'pid': os.getpid(),
+                               'tid': 0, 'args': {'count': n}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def saveTrace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f)
+
+probe = instrumentation()  # the one shared instance
+
+def main():
+    # instruments a few Otto cycle calculations and shows what was recorded
+    from Otto import ottoCycleController
+    from Air import air
+    from Instrument import probe  # the instance Air and Otto use (when run as a script, this module is __main__)
+    probe.enable()
+    oc = ottoCycleController(headless=True)
+    for ratio in (6.0, 8.0, 10.0):
+        oc.set(T_0=300.0, P_0=1.0E5, V_0=1.0E-3, T_High=1500.0, ratio=ratio)
+    a = air()
+    a.setPropertyMethod('quad')
+    a.set(T=1500.0, P=1.0E6)
+    a.set(P=1.0E6, h=a.State.h)
+    probe.disable()
+    print(probe.summary())
+    probe.saveTrace('otto_trace.json')
+    print('trace saved to otto_trace.json')
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,26 @@
 from Air import *
-from matplotlib import pyplot as plt
-from PyQt5 import QtWidgets as qtw
+from Instrument import probe
+import math
 import sys
+# PyQt5 and matplotlib.pyplot are imported where they are needed, so the model and controller can be used (e.g.,
+# headless) without loading the GUI stack
 
 class ottoCycleModel():
+    # what each calculated part of the model depends on (inputs and other parts), listed in calculation order
+    dependencies = {'State1': ('T_initial', 'p_initial'),
+                    'State2': ('State1', 'Ratio'),
+                    'State3': ('State2', 'T_high'),
+                    'State4': ('State1', 'State3'),
+                    'Energies': ('State1', 'State2', 'State3', 'State4'),
+                    'Moles': ('State1', 'V_Cylinder'),
+                    'Curves': ('State1', 'State2', 'State3', 'State4')}
+    # the attributes each part sets
+    outputs = {'State1': ('State1',), 'State2': ('State2',), 'State3': ('State3',), 'State4': ('State4',),
+               'Energies': ('W_Compression', 'W_Power', 'Q_In', 'Q_Out', 'W_Cycle', 'Eff'),
+               'Moles': ('n', 'm'),
+               'Curves': ('upperCurve', 'lowerCurve')}
+    outputOf = {name: node for node, names in outputs.items() for name in names}
+
     def __init__(self, p_initial=1000.0, v_cylinder=1.0, t_initial=298, t_high=1500.0, ratio=6.0, name='Air Standard Otto Cycle'):
         """
         Constructor for an air standard otto cycle.  The Otto has 4 primary states and consists of four thermodynamic
@@ -16,6 +33,9 @@ class ottoCycleModel():
         Power stroke work = (u3-u4)
         Heat in = (u3-u2)
         Heat out = (u4-u1)
+        Nothing is calculated here.  The states, energies, moles and curves (see outputs) are calculated the first
+        time they are read, and again the first time they are read after an input they depend on changes.
+        ottoCycleController.updateModel calculates everything that is out of date at once.
         :param p_initial: Pressure in Pa
         :type p_initial: float
         :param v_cylinder: Volume in m^3
@@ -31,53 +51,205 @@ class ottoCycleModel():
         """
         self.units=units()
         self.air = air()  # the working fluid
-        self.air.set(P=p_initial, T=t_initial)  # initial state if fixed at p_initial, t_initial
         self.p_initial=p_initial
         self.T_initial=t_initial
         self.T_high=t_high
         self.Ratio=ratio  # the compression ratio V_BDC/V_TDC
         self.V_Cylinder=v_cylinder
-        self.air.n=self.V_Cylinder/self.air.State.v  # calcualte number of moles of air
-        self.air.m=self.air.n*self.air.MW
-
-        self.State1=self.air.set(P=self.p_initial, T=self.T_initial)
-        self.State2=self.air.set(v=self.State1.v/self.Ratio, s=self.State1.s)
-        self.State3=self.air.set(T=self.T_high, v=self.State2.v)
-        self.State4=self.air.set(v=self.State1.v, s=self.State3.s)
-        
-        self.W_Compression = self.air.n*(self.State2.u-self.State1.u)
-        self.W_Power = self.air.n*(self.State3.u-self.State3.u)
-        self.Q_In = self.air.n*(self.State3.u-self.State2.u)
-        self.Q_Out = self.air.n*(self.State4.u-self.State1.u)
-        
-        self.W_Cycle=self.W_Power-self.W_Compression
-        self.Eff=self.W_Cycle/self.Q_In
-
-        self.upperCurve=StateDataForPlotting()
-        self.lowerCurve=StateDataForPlotting()
+        self.name=name
+
+        # everything needs to be calculated the first time it is read
+        self.dirty=set(self.dependencies)
+        self.dataVersion=0  # goes up every time calculated data changes, so views know to convert it again
+
+    def __getattr__(self, name):
+        # only called for attributes that are not set:  the outputs of parts that have not been calculated yet
+        node=type(self).outputOf.get(name)
+        if node is None:
+            raise AttributeError("'ottoCycleModel' object has no attribute '{}'".format(name))
+        self.calcNode(node)
+        return self.__dict__[name]
 
     def getSI(self):
         return self.units.SI
-    
+
+    def setInputs(self, **inputs):
+        """
+        Sets inputs of the cycle (T_initial, p_initial, T_high, V_Cylinder, Ratio in SI units) and marks the parts
+        of the model that depend on the inputs that changed as needing to be recalculated.
+        :return: none
+        """
+        for name, val in inputs.items():
+            if not math.isclose(getattr(self, name), val, rel_tol=1.0E-12):
+                setattr(self, name, val)
+                self.markDirty(name)
+
+    def markDirty(self, name):
+        # marks everything downstream of name as needing to be recalculated and forgets its old values, so they are
+        # calculated again when they are read
+        for node, deps in self.dependencies.items():
+            if name in deps:
+                self.dirty.add(node)
+                for out in self.outputs[node]:
+                    self.__dict__.pop(out, None)
+                self.markDirty(node)
+
+    def calcNode(self, node):
+        """
+        Calculates one part of the model.  The parts it depends on are calculated first if they have not been.
+        """
+        M=self
+        #note that all state calculations are for molar values.  getState doesn't change the air object, so one air
+        #model can be shared by models on different threads.
+        if node=='State1':
+            M.State1=M.air.getState(P=M.p_initial, T=M.T_initial, name='State 1 - BDC')
+        elif node=='State2':
+            M.State2=M.air.getState(v=M.State1.v/M.Ratio, s=M.State1.s, name='State 2 - TDC')
+        elif node=='State3':
+            M.State3=M.air.getState(T=M.T_high, v=M.State2.v, name='State 3 - TDC')
+        elif node=='State4':
+            M.State4=M.air.getState(v=M.State1.v, s=M.State3.s, name='State 4 - BDC')
+        elif node=='Energies':
+            M.W_Compression = M.State2.u - M.State1.u
+            M.W_Power = M.State3.u - M.State4.u
+            M.Q_In = M.State3.u - M.State2.u
+            M.Q_Out = M.State4.u - M.State1.u
+            M.W_Cycle = M.W_Power - M.W_Compression
+            M.Eff = 100.0*M.W_Cycle / M.Q_In
+        elif node=='Moles':
+            # the moles and mass belong to this cycle, not to the air object, which may be shared by other models
+            M.n=M.V_Cylinder/M.State1.v  # calcualte number of moles of air
+            M.m=M.n*M.air.MW
+        elif node=='Curves':
+            self.buildDataForPlotting()
+        self.dirty.discard(node)
+        self.dataVersion+=1
+
+    def buildDataForPlotting(self, nPoints=None, tol=1.0E-3, maxPoints=100, X=None, Y=None, logx=False, logy=False):
+        """
+        I want to create state data between states 1-2, 2-3, 3-4, 4-1
+        I'll piece together an upperCurve data set from 2-3, 3-4, 4-1
+        The lowerCurve data set is 1-2
+        The constant volume processes are a temperature sweep at fixed v and the isentropic processes are a volume
+        sweep at fixed s (T from inverting s(T,v)).  Each process is sampled adaptively by sampleProcess, so the
+        points bunch up where the curve bends and straight stretches get only a few.
+        :param nPoints: if given, use this many evenly spaced points on each process instead of adaptive sampling
+        :param tol: allowed error of a straight line between points as a fraction of the plot range
+        :param maxPoints: most points allowed on a process
+        :param X: property on the X axis (if None, every property is checked so any pair of axes looks smooth)
+        :param Y: property on the Y axis
+        :param logx: True if X is plotted on a log scale
+        :param logy: True if Y is plotted on a log scale
+        :return:
+        """
+        # new curves replace the old ones (the old ones may still be on a plot)
+        upperCurve=StateDataForPlotting()
+        lowerCurve=StateDataForPlotting()
+        M=self
+        # the coordinates that have to look smooth and their ranges over the cycle
+        if X is None or Y is None:
+            coords=[(w, False) for w in 'TPuhsv']+[('P', True), ('v', True)]
+        else:
+            coords=[(X, logx), (Y, logy)]
+        states=(M.State1, M.State2, M.State3, M.State4)
+        scales=[]
+        for w, log in coords:
+            vals=np.array([st.getVal(w) for st in states])
+            vals=np.log(vals) if log else vals
+            scales.append(max(vals.max()-vals.min(), 1.0E-12))
+        sample=lambda sweep, start, end, **fixed: self.sampleProcess(sweep, start, end, fixed, coords, scales,
+                                                                     nPoints=nPoints, tol=tol, maxPoints=maxPoints)
+        #region build upperCurve
+        # states from 2-3 (v=const, T from T2->T3)
+        upperCurve.addStates(sample('T', M.State2.T, M.State3.T, v=M.State2.v))
+        # states from 3-4 (v=from TDC to BDC, s=const.)
+        upperCurve.addStates(sample('v', M.State3.v, M.State4.v, s=M.State3.s))
+        # states from 4-1 (v=const, T from T4->T1)
+        upperCurve.addStates(sample('T', M.State4.T, M.State1.T, v=M.State4.v))
+        #endregion
+
+        #region build lowerCurve
+        # states from 1-2 (v=from BDC to TDC, s=const.)
+        lowerCurve.addStates(sample('v', M.State1.v, M.State2.v, s=M.State1.s))
+        #endregion
+        self.upperCurve=upperCurve
+        self.lowerCurve=lowerCurve
+        self.dataVersion+=1
+
+    def sampleProcess(self, sweep, start, end, fixed, coords, scales, nPoints=None, tol=1.0E-3, maxPoints=100, nStart=5):
+        """
+        Samples a process where one property (sweep) goes from start to end while another one is held fixed.
+        Starting from nStart evenly spaced points, each interval is split at its midpoint while the midpoint is
+        farther than tol*scale from the straight line between the ends of the interval in any of the plot
+        coordinates.  The midpoints of all the intervals are calculated together with air.set_many.
+        :param sweep: name of the property that changes ('T' or 'v')
+        :param start: value of sweep at the start of the process
+        :param end: value of sweep at the end of the process
+        :param fixed: dictionary with the property held constant, e.g., {'v': v2}
+        :param coords: list of (property, log) pairs for the plot coordinates
+        :param scales: range of each plot coordinate
+        :param nPoints: if given, use this many evenly spaced points and skip the refinement
+        :param tol: allowed error as a fraction of the range of a coordinate (~1 pixel on a 1000 pixel plot)
+        :param maxPoints: most points allowed on the process
+        :param nStart: number of evenly spaced points to start from
+        :return: a StateArray in order from start to end
+        """
+        a=self.air
+        getState=lambda t: a.set_many(**{sweep: start+t*(end-start)}, **fixed)
+        getCoords=lambda st: [np.log(st.getVal(w)) if log else st.getVal(w) for w, log in coords]
+        t=np.linspace(0.0, 1.0, nStart if nPoints is None else nPoints)
+        states=getState(t)
+        if nPoints is not None:
+            return states
+        cols=getCoords(states)
+        while t.size<maxPoints:
+            tMid=0.5*(t[:-1]+t[1:])
+            mid=getState(tMid)
+            colsMid=getCoords(mid)
+            err=np.zeros(tMid.size)
+            for q, qMid, scale in zip(cols, colsMid, scales):
+                err=np.maximum(err, np.abs(qMid-0.5*(q[:-1]+q[1:]))/scale)
+            split=np.nonzero(err>tol)[0]
+            if split.size==0:
+                break
+            if t.size+split.size>maxPoints:  # only split the worst intervals
+                split=np.sort(split[np.argsort(err[split])[::-1][:maxPoints-t.size]])
+            t=np.insert(t, split+1, tMid[split])
+            states=StateArray(**{w: np.insert(states.getVal(w), split+1, mid.getVal(w)[split]) for w in 'TPuhsv'})
+            cols=[np.insert(q, split+1, qMid[split]) for q, qMid in zip(cols, colsMid)]
+        return states
+
 class ottoCycleController():
-    def __init__(self, model=None, ax=None):
+    def __init__(self, model=None, ax=None, headless=False, cache=None):
+        """
+        :param model: an ottoCycleModel (a new one is made if None)
+        :param ax: matplotlib axes to plot on
+        :param headless: if True, no view (or widgets) is made, e.g., for calculating on a worker thread
+        :param cache: an Otto_cache.ottoCycleCache to look cycles up in before calculating them (None for no cache)
+        """
         self.model=ottoCycleModel() if model is None else model
-        self.view=ottoCycleView()
-        self.view.ax = ax
+        self.view=None if headless else ottoCycleView()
+        if self.view is not None:
+            self.view.ax = ax
+        self.cancelled=None  # optional function that returns True when a calculation in progress should stop
+        self.previewPoints=8  # points per process for the curves of a preview (see set)
+        self.cache=cache
 
     #region Functions that operate on the model (i.e., change model state)
     def calc(self):
+        self.set(**self.getInputs())
+
+    def getInputs(self):
         # read values from the GUI
-        t0=self.view.le_TLow.text()
         T0=float(self.view.le_TLow.text())
         P0=float(self.view.le_P0.text())
         V0=float(self.view.le_V0.text())
         TH=float(self.view.le_THigh.text())
         CR=float(self.view.le_CR.text())
         metric=self.view.rdo_Metric.isChecked()
-        self.set(T_0=T0, P_0=P0, V_0=V0, T_High=TH, ratio=CR, SI=metric)
+        return dict(T_0=T0, P_0=P0, V_0=V0, T_High=TH, ratio=CR, SI=metric)
 
-    def set(self, T_0=25.0, P_0=100.0, V_0=1.0, T_High=1500.0, ratio=6.0, SI=True):
+    def set(self, T_0=25.0, P_0=100.0, V_0=1.0, T_High=1500.0, ratio=6.0, SI=True, preview=False):
         """
         Sets the initial state of the air and converts units from input
         :param T_0: Initial temperature in absolute units (R or K)
@@ -86,76 +258,57 @@ class ottoCycleController():
         :param T_High: High temperature in (R or K)
         :param ratio: Compression ratio
         :param SI: boolean
+        :param preview: if True, the curves are only roughly sampled (previewPoints per process) so the cycle can be
+                        redrawn while an input is being dragged.  The curves stay marked out of date, so the next
+                        full calculation refines them.
         :return: none
         """
-        self.model.units.set(SI=SI)
-        self.model.T_initial=T_0 if SI else T_0/self.model.units.CF_T
-        self.model.p_initial=P_0 if SI else P_0/self.model.units.CF_P
-        self.model.T_high=T_High if SI else T_High/self.model.units.CF_T
-        self.model.V_Cylinder=V_0 if SI else V_0/self.model.units.CF_V
-        self.model.Ratio=ratio
-
-        #note that all state calculations are for molar values
-        self.model.State1=self.model.air.set(P=self.model.p_initial, T=self.model.T_initial, name='State 1 - BDC')
-        self.model.State2=self.model.air.set(v=self.model.State1.v/self.model.Ratio, s=self.model.State1.s, name='State 2 - TDC')
-        self.model.State3=self.model.air.set(T=self.model.T_high, v=self.model.State2.v, name='State 3 - TDC')
-        self.model.State4=self.model.air.set(v=self.model.State1.v, s=self.model.State3.s, name='State 4 - BDC')
-
-        self.model.air.n=self.model.V_Cylinder/self.model.air.State.v  # calcualte number of moles of air
-        self.model.air.m=self.model.air.n*self.model.air.MW
-
-        self.model.W_Compression = self.model.State2.u - self.model.State1.u
-        self.model.W_Power = self.model.State3.u - self.model.State4.u
-        self.model.Q_In = self.model.State3.u - self.model.State2.u
-        self.model.Q_Out = self.model.State4.u - self.model.State1.u
-
-        self.model.W_Cycle = self.model.W_Power - self.model.W_Compression
-        self.model.Eff = 100.0*self.model.W_Cycle / self.model.Q_In
-
-        self.buildDataForPlotting()
-        self.updateView()
-
-    def buildDataForPlotting(self ):
+        with probe.span('ottoCycleController.set', cat='otto'):
+            self.model.units.set(SI=SI)  # the units only change what is displayed
+            TCF, PCF, uCF, hCF, sCF, VCF = self.model.units.getFactors(SI=SI, total=True).tolist()  # V for one mole
+            self.model.setInputs(T_initial=T_0/TCF, p_initial=P_0/PCF, T_high=T_High/TCF, V_Cylinder=V_0/VCF,
+                                 Ratio=ratio)
+            self.updateModel(preview=preview)
+            if self.view is not None:
+                with probe.span('plotting', cat='otto'):
+                    self.updateView(keepLimits=preview)
+
+    def updateModel(self, preview=False):
         """
-        I want to create state data between states 1-2, 2-3, 3-4, 4-1
-        I'll piece together an upperCurve data set from 2-3, 3-4, 4-1
-        The lowerCurve data set is 1-2
-        :return:
+        Recalculates only the parts of the model that are out of date (see ottoCycleModel.dependencies).
+        If there is a cache, the cycle is looked up there first, and a fully calculated cycle is stored in it.
+        Previews neither look up nor store cycles.
+        If self.cancelled returns True between parts, this stops and leaves the rest marked out of date.
+        :param preview: if True, the curves are roughly sampled and left marked out of date
+        :return: none
         """
-        # clear out any old data
-        self.model.upperCurve.clear()
-        self.model.lowerCurve.clear()
-        a = air()  # an air object
-        #region build upperCurve
-        # region states from 2-3 (v=const, T from T2->T3)
-        DeltaT=np.linspace(self.model.State2.T, self.model.State3.T, 30)
-        for T in DeltaT:
-            state = a.set(T=T, v=self.model.State2.v)
-            self.model.upperCurve.add((state.T, state.P, state.u, state.h, state.s, state.v))
-        # endregion
-        # region states from 3-4 (v=from TDC to BDC, s=const.)
-        DeltaV = np.linspace(self.model.State3.v, self.model.State4.v, 30)
-        for v in DeltaV:
-            state = a.set(v=v, s=self.model.State3.s)
-            self.model.upperCurve.add((state.T, state.P, state.u, state.h, state.s, state.v))
-        # endregion
-        # region states from 4-1 (v=const, T from T4->T1)
-        DeltaT=np.linspace(self.model.State4.T, self.model.State1.T, 30)
-        for T in DeltaT:
-            state = a.set(T=T, v=self.model.State4.v)
-            self.model.upperCurve.add((state.T, state.P, state.u, state.h, state.s, state.v))
-        # endregion
-        #endregion
-
-        #region build lowerCurve
-        # region states from 1-2 (v=from BDC to TDC, s=const.)
-        DeltaV=np.linspace(self.model.State1.v, self.model.State2.v, 30)
-        for v in DeltaV:
-            state = a.set(v=v, s=self.model.State1.s)
-            self.model.lowerCurve.add((state.T, state.P, state.u, state.h, state.s, state.v))
-        # endregion
-        #endregion
-    #endregion
+        if not self.model.dirty:
+            return
+        if self.cache is not None and not preview:
+            with probe.span('cache lookup', cat='otto'):
+                if self.cache.load(self.model):
+                    self.model.dirty.clear()
+                    self.model.dataVersion+=1
+                    return
+        for node in self.model.dependencies:
+            if self.cancelled is not None and self.cancelled():
+                return
+            if node in self.model.dirty:
+                with probe.span(node, cat='otto'):
+                    if preview and node=='Curves':
+                        self.buildDataForPlotting(nPoints=self.previewPoints)  # stays out of date
+                        continue
+                    self.calcNode(node)
+        if self.cache is not None and not self.model.dirty:
+            with probe.span('cache store', cat='otto'):
+                self.cache.save(self.model)
+
+    def calcNode(self, node):
+        self.model.calcNode(node)
+
+    def buildDataForPlotting(self, **kwargs):
+        # see ottoCycleModel.buildDataForPlotting
+        self.model.buildDataForPlotting(**kwargs)
 
     # region Functions that operate on the view
     def plot_cycle_XY(self, X='s', Y='T', logx=False, logy=False, mass=False, total=False):
@@ -181,54 +334,69 @@ class ottoCycleController():
         tlow=self.view.le_TLow.text()
         pass
 
-    def updateView(self):
-        self.view.updateView(cycle=self.model)
+    def updateView(self, keepLimits=False):
+        self.view.updateView(cycle=self.model, keepLimits=keepLimits)
     #endregion
 
 class ottoCycleView():
-    def __init__(self):
+    def __init__(self, widgets=True):
+        """
+        :param widgets: if False, no Qt widgets are made and the view can only plot (e.g., onto an Agg canvas)
+        """
         #region define some widgets
-        self.lbl_THigh = qtw.QLabel()
-        self.lbl_TLow = qtw.QLabel() 
-        self.lbl_P0 = qtw.QLabel() 
-        self.lbl_V0 = qtw.QLabel() 
-        self.lbl_CR = qtw.QLabel()
-        self.le_THigh = qtw.QLineEdit() 
-        self.le_TLow = qtw.QLineEdit() 
-        self.le_P0 = qtw.QLineEdit() 
-        self.le_V0 = qtw.QLineEdit() 
-        self.le_CR = qtw.QLineEdit()
-        self.le_T1 = qtw.QLineEdit() 
-        self.le_T2 = qtw.QLineEdit() 
-        self.le_T3 = qtw.QLineEdit() 
-        self.le_T4 = qtw.QLineEdit()
-        self.lbl_T1Units = qtw.QLabel() 
-        self.lbl_T2Units = qtw.QLabel() 
-        self.lbl_T3Units = qtw.QLabel() 
-        self.lbl_T4Units = qtw.QLabel()
-        self.le_Efficiency = qtw.QLineEdit() 
-        self.le_PowerStroke = qtw.QLineEdit()
-        self.le_CompressionStroke=qtw.QLineEdit()
-        self.le_HeatAdded = qtw.QLineEdit()
-        self.lbl_PowerStrokeUnits=qtw.QLabel()
-        self.lbl_CompressionStrokeUnits=qtw.QLabel()
-        self.lbl_HeatInUnits = qtw.QLabel()
-        self.rdo_Metric = qtw.QRadioButton()
-        self.cmb_Abcissa = qtw.QComboBox()
-        self.cmb_Ordinate = qtw.QComboBox()
-        self.chk_LogAbcissa = qtw.QCheckBox()
-        self.chk_LogOrdinate = qtw.QCheckBox()
+        if widgets:
+            from PyQt5 import QtWidgets as qtw
+            self.lbl_THigh = qtw.QLabel()
+            self.lbl_TLow = qtw.QLabel() 
+            self.lbl_P0 = qtw.QLabel() 
+            self.lbl_V0 = qtw.QLabel() 
+            self.lbl_CR = qtw.QLabel()
+            self.le_THigh = qtw.QLineEdit() 
+            self.le_TLow = qtw.QLineEdit() 
+            self.le_P0 = qtw.QLineEdit() 
+            self.le_V0 = qtw.QLineEdit() 
+            self.le_CR = qtw.QLineEdit()
+            self.le_T1 = qtw.QLineEdit() 
+            self.le_T2 = qtw.QLineEdit() 
+            self.le_T3 = qtw.QLineEdit() 
+            self.le_T4 = qtw.QLineEdit()
+            self.lbl_T1Units = qtw.QLabel() 
+            self.lbl_T2Units = qtw.QLabel() 
+            self.lbl_T3Units = qtw.QLabel() 
+            self.lbl_T4Units = qtw.QLabel()
+            self.le_Efficiency = qtw.QLineEdit() 
+            self.le_PowerStroke = qtw.QLineEdit()
+            self.le_CompressionStroke=qtw.QLineEdit()
+            self.le_HeatAdded = qtw.QLineEdit()
+            self.lbl_PowerStrokeUnits=qtw.QLabel()
+            self.lbl_CompressionStrokeUnits=qtw.QLabel()
+            self.lbl_HeatInUnits = qtw.QLabel()
+            self.rdo_Metric = qtw.QRadioButton()
+            self.cmb_Abcissa = qtw.QComboBox()
+            self.cmb_Ordinate = qtw.QComboBox()
+            self.chk_LogAbcissa = qtw.QCheckBox()
+            self.chk_LogOrdinate = qtw.QCheckBox()
         self.canvas=None
         self.ax=None
         #endregion
+        #region persistent plot artists (see plot_cycle_XY)
+        self.lines=None  # Line2D objects for the lower curve, upper curve and state markers
+        self.layout=None  # what the axes were last set up for
+        self.background=None  # copy of the canvas without the lines for blitting
+        self.drawCid=None  # draw_event connection id
+        #endregion
+        #region converted plot data (see getColumn)
+        self.columns={}  # (property, SI, mass, total): (lower curve, upper curve, states) in those units
+        self.columnsFor=None  # (model, dataVersion) the columns were converted from
+        #endregion
 
-    def updateView(self, cycle):
+    def updateView(self, cycle, keepLimits=False):
         cycle.units.SI=self.rdo_Metric.isChecked()
         logx=self.chk_LogAbcissa.isChecked()
         logy=self.chk_LogOrdinate.isChecked()
         xvar=self.cmb_Abcissa.currentText()
         yvar=self.cmb_Ordinate.currentText()
-        self.plot_cycle_XY(cycle, X=xvar, Y=yvar, logx=logx, logy=logy, mass=False, total=True)
+        self.plot_cycle_XY(cycle, X=xvar, Y=yvar, logx=logx, logy=logy, mass=False, total=True, keepLimits=keepLimits)
         self.updateDisplayWidgets(Model=cycle)
 
     def print_summary(self, cycle):
@@ -256,120 +424,147 @@ class ottoCycleView():
         return s
 
     def convertDataCol(self, cycle, data=None, colName='T', mass=False, total=False):
-        UC=cycle.units
-        n=cycle.air.n
-        MW=cycle.air.MW
-        TCF = 1.0 if UC.SI else UC.CF_T
-        PCF = 1.0 if UC.SI else UC.CF_P
-        hCF = 1.0 if UC.SI else UC.CF_e
-        uCF = 1.0 if UC.SI else UC.CF_e
-        sCF = 1.0 if UC.SI else UC.CF_s
-        vCF = 1.0 if UC.SI else UC.CF_v  # convert m^3/mol to ft^3/lbmol
-        nCF = 1.0 if UC.SI else UC.CF_n  # convert mol to lbmol
-        mCF = 1.0 if UC.SI else UC.CF_Mass
-        if mass:
-            hCF/=MW  # kJ/kmol to kJ/kg  or Btu/lbmol to Btu/lbmass
-            uCF/=MW
-            sCF/=MW
-            vCF/=MW
-        elif total:
-            hCF*=n*nCF
-            uCF*=n*nCF
-            sCF*=n*nCF
-            vCF*=n*nCF
-        w=colName.lower()
-        if w=='t':
-            return [T*TCF for T in data]
-        if w=='h':
-            return [h*hCF for h in data]
-        if w=='u':
-            return [u*uCF for u in data]
-        if w=='s':
-            return [s*sCF for s in data]
-        if w=='v':
-            return [v*vCF for v in data]
-        if w=='p':
-            return [P*PCF for P in data]
-
-    def plot_cycle_XY(self, cycle, X='s', Y='T',logx=False, logy=False, mass=False, total=False):
+        return data*self.getFactors(cycle, mass=mass, total=total)[units.colIndex[colName.lower()]]
+
+    def getFactors(self, cycle, mass=False, total=False):
+        # the conversion vector from molar SI units to the units the cycle is shown in (see units.getFactors)
+        return cycle.units.getFactors(SI=cycle.units.SI, mass=mass, total=total, n=cycle.n, MW=cycle.air.MW)
+
+    def getColumn(self, cycle, W='T', mass=False, total=False):
+        """
+        One property of the lower curve, upper curve and states 1-4 in the units the cycle is shown in.  Converted
+        columns are kept until the data of the cycle changes (a different model or a new dataVersion), so switching
+        axes, log scales or units back and forth only converts each column once.
+        :param W: letter for the property
+        :return: (lower curve, upper curve, states) numpy arrays
+        """
+        if self.columnsFor is None or self.columnsFor[0] is not cycle or self.columnsFor[1]!=cycle.dataVersion:
+            self.columns={}
+            self.columnsFor=(cycle, cycle.dataVersion)
+        key=(W.lower(), cycle.units.SI, mass, total and not mass)
+        col=self.columns.get(key)
+        if col is None:
+            i=units.colIndex[key[0]]
+            CF=self.getFactors(cycle, mass=mass, total=total)[i]
+            states=np.array([st.getVal(W) for st in (cycle.State1, cycle.State2, cycle.State3, cycle.State4)])
+            col=(cycle.lowerCurve.data[i, :len(cycle.lowerCurve)]*CF, cycle.upperCurve.data[i, :len(cycle.upperCurve)]*CF,
+                 states*CF)
+            self.columns[key]=col
+        return col
+
+    def plot_cycle_XY(self, cycle, X='s', Y='T',logx=False, logy=False, mass=False, total=False, keepLimits=False):
         """
         I want to plot any two thermodynaimc properties on X and Y
         Data is in molar metric units.  I may need to convert it.
+        The converted columns come from getColumn, so replotting data that was already shown needs no conversions.
+        The lines for the curves and the state markers are made once and then updated with set_data.  The axis
+        labels and scales are only touched when they change, and when the axis limits stay the same, only the
+        lines are redrawn over a saved copy of the rest of the canvas (blitting).
         :param X: letter for which variable to plot on X axis
         :param Y: letter for which variable to plot on Y axis
+        :param keepLimits: if True, the axis limits are only changed when the cycle no longer fits inside them, so
+                           most redraws while dragging an input can be blitted
         :return:
         """
         if X==Y:
             return
         QTPlotting = True  # assumes we are plotting onto a QT GUI form
         if self.ax == None:
+            from matplotlib import pyplot as plt
             self.ax = plt.subplot()
             QTPlotting = False  # actually, we are just using CLI and showing the plot
 
         ax = self.ax
-        ax.clear()
-
-        ax.set_xscale('log' if logx else 'linear')
-        ax.set_yscale('log' if logy else 'linear')
-
-        # plot the upper and lower curves
-        XdataLC=self.convertDataCol(cycle, colName=X,data=cycle.lowerCurve.getDataCol(X), mass=mass, total=total)
-        YdataLC=self.convertDataCol(cycle, colName=Y,data=cycle.lowerCurve.getDataCol(Y), mass=mass, total=total)
-        XdataUC=self.convertDataCol(cycle, colName=X,data=cycle.upperCurve.getDataCol(X), mass=mass, total=total)
-        YdataUC=self.convertDataCol(cycle, colName=Y,data=cycle.upperCurve.getDataCol(Y), mass=mass, total=total)
-        ax.plot(XdataLC, YdataLC, color='k')
-        ax.plot(XdataUC, YdataUC, color='g')
-
-        # add axis labels
+        if self.lines is None or self.lines[0].axes is not ax:
+            self.makeArtists(animated=QTPlotting)
+        lowerLine, upperLine, stateMarkers = self.lines
+
+        # the upper and lower curves and the circles for states 1, 2, 3, and 4
+        lowerX, upperX, statesX=self.getColumn(cycle, X, mass=mass, total=total)
+        lowerY, upperY, statesY=self.getColumn(cycle, Y, mass=mass, total=total)
+        lowerLine.set_data(lowerX, lowerY)
+        upperLine.set_data(upperX, upperY)
+        stateMarkers.set_data(statesX, statesY)
+
+        # axis scales and labels
         cycle.units.setPlotUnits(SI=cycle.units.SI, mass=mass, total=total)
-        ax.set_ylabel(cycle.lowerCurve.getAxisLabel(Y, Units=cycle.units), fontsize='large')
-        ax.set_xlabel(cycle.lowerCurve.getAxisLabel(X, Units=cycle.units), fontsize='large')
+        layout=(logx, logy, cycle.lowerCurve.getAxisLabel(X, Units=cycle.units), cycle.lowerCurve.getAxisLabel(Y, Units=cycle.units))
+        relayout = layout != self.layout
+        if relayout:
+            ax.set_xscale('log' if logx else 'linear')
+            ax.set_yscale('log' if logy else 'linear')
+            ax.set_xlabel(layout[2], fontsize='large')
+            ax.set_ylabel(layout[3], fontsize='large')
+            self.layout=layout
+
+        # set limits on x and y
+        limits=(ax.get_xlim(), ax.get_ylim())
+        if relayout or not (keepLimits and self.fits(limits)):
+            ax.relim()
+            ax.autoscale_view()
+
+        # show the plot
+        if QTPlotting == False:
+            from matplotlib import pyplot as plt
+            plt.show()
+        elif self.background is not None and not relayout and limits == (ax.get_xlim(), ax.get_ylim()):
+            # only the lines changed
+            self.canvas.restore_region(self.background)
+            self.drawArtists()
+            self.canvas.blit(ax.figure.bbox)
+        else:
+            self.canvas.draw()  # onDraw saves the background and draws the lines
+
+    def fits(self, limits):
+        # True if all the lines lie inside the (xlim, ylim) limits
+        (x0, x1), (y0, y1) = limits
+        for line in self.lines:
+            x, y = line.get_data()
+            if len(x) and (min(x) < min(x0, x1) or max(x) > max(x0, x1) or min(y) < min(y0, y1) or max(y) > max(y0, y1)):
+                return False
+        return True
+
+    def makeArtists(self, animated=True):
+        """
+        Sets up the axes and makes the lines for the curves and the state markers.  Animated lines are left out of
+        a normal draw of the canvas, so onDraw can save the background without them and then draw them on top.
+        """
+        ax=self.ax
+        ax.clear()
+        lowerLine,=ax.plot([], [], color='k', animated=animated)
+        upperLine,=ax.plot([], [], color='g', animated=animated)
+        stateMarkers,=ax.plot([], [], linestyle='', marker='o', markerfacecolor='w', markeredgecolor='k', animated=animated)
+        self.lines=(lowerLine, upperLine, stateMarkers)
+        self.layout=None
+        self.background=None
 
         # put a title on the plot
-        cycle.name = 'Otto Cycle'
-        ax.set_title(cycle.name, fontsize='large')
+        ax.set_title('Otto Cycle', fontsize='large')
 
         # modify the tick marks
         ax.tick_params(axis='both', which='both', direction='in', top=True, right=True,labelsize='large')
 
-        # plot the circles for states 1, 2, 3, and 4
-        state1=dc(cycle.State1)
-        state1.ConvertStateData(SI=cycle.getSI(), Units=cycle.units, n=cycle.air.n, MW=cycle.air.MW, mass=mass, total=total)
-        state2=dc(cycle.State2)
-        state2.ConvertStateData(SI=cycle.getSI(), Units=cycle.units, n=cycle.air.n, MW=cycle.air.MW, mass=mass, total=total)
-        state3=dc(cycle.State3)
-        state3.ConvertStateData(SI=cycle.getSI(), Units=cycle.units, n=cycle.air.n, MW=cycle.air.MW, mass=mass, total=total)
-        state4=dc(cycle.State4)
-        state4.ConvertStateData(SI=cycle.getSI(), Units=cycle.units, n=cycle.air.n, MW=cycle.air.MW, mass=mass, total=total)
-
-        ax.plot(state1.getVal(X), state1.getVal(Y), marker='o', markerfacecolor='w', markeredgecolor='k')
-        ax.plot(state2.getVal(X), state2.getVal(Y), marker='o', markerfacecolor='w', markeredgecolor='k')
-        ax.plot(state3.getVal(X), state3.getVal(Y), marker='o', markerfacecolor='w', markeredgecolor='k')
-        ax.plot(state4.getVal(X), state4.getVal(Y), marker='o', markerfacecolor='w', markeredgecolor='k')
-        # # set limits on x and y
-        xmin = min(min(cycle.upperCurve.getDataCol(X)), min(cycle.lowerCurve.getDataCol(X)))
-        xmax = max(max(cycle.upperCurve.getDataCol(X)), max(cycle.lowerCurve.getDataCol(X)))
-        ymin=min(min(cycle.upperCurve.getDataCol(Y)), min(cycle.lowerCurve.getDataCol(Y)))
-        ymax=max(max(cycle.upperCurve.getDataCol(Y)), max(cycle.lowerCurve.getDataCol(Y)))
-        #ax.set_xlim(xmin,xmax)
-        #ax.set_ylim(ymin,ymax)
-        deltax=xmax-xmin
-        deltay=ymax-ymin
-        # add the summary text to the plot
-        # ax.text(xmin+0.05*deltax, ymin+0.7*deltay, self.get_summary(cycle))
-        # show the plot
-        if QTPlotting == False:
-            plt.show()
-        else:
-            self.canvas.draw()
+        if animated and self.canvas is not None:
+            if self.drawCid is not None:
+                self.canvas.mpl_disconnect(self.drawCid)
+            self.drawCid=self.canvas.mpl_connect('draw_event', self.onDraw)
+
+    def onDraw(self, event):
+        # called after every full draw of the canvas (including resizes)
+        self.background=self.canvas.copy_from_bbox(self.ax.figure.bbox)
+        self.drawArtists()
+
+    def drawArtists(self):
+        for line in self.lines:
+            self.ax.draw_artist(line)
 
     def updateDisplayWidgets(self, Model=None):
         # fill out the temperature values
 
         U=Model.units
-        SI=U.SI
-        CFT = 1.0 if SI else U.CF_T
-        CFE = 1.0 if SI else U.CF_E
+        CF=self.getFactors(Model, total=True)
+        CFT = CF[0]
+        CFE = CF[2]  # the energies are J/mol, so this gives the total for the air in the cylinder
 
         self.lbl_THigh.setText('T High ({})'.format(Model.units.TUnits))
         self.lbl_TLow.setText('T Low ({})'.format(Model.units.TUnits))
@@ -386,9 +581,9 @@ class ottoCycleView():
 
         # fill out the other properties for the otto cycle
         self.le_Efficiency.setText('{:0.3f}'.format(Model.Eff))
-        self.le_PowerStroke.setText('{:0.3f}'.format(Model.air.n*Model.W_Power*CFE))
-        self.le_CompressionStroke.setText('{:0.3f}'.format(Model.air.n*Model.W_Compression*CFE))
-        self.le_HeatAdded.setText('{:0.3f}'.format(Model.air.n*Model.Q_In*CFE))
+        self.le_PowerStroke.setText('{:0.3f}'.format(Model.W_Power*CFE))
+        self.le_CompressionStroke.setText('{:0.3f}'.format(Model.W_Compression*CFE))
+        self.le_HeatAdded.setText('{:0.3f}'.format(Model.Q_In*CFE))
         self.lbl_PowerStrokeUnits.setText(Model.units.EUnits)
         self.lbl_CompressionStrokeUnits.setText(Model.units.EUnits)
         self.lbl_HeatInUnits.setText(Model.units.EUnits)
@@ -401,5 +596,6 @@ def main():
     #oc.plot_cycle_XY(X='s', Y='T', mass=True)
 
 if __name__ == "__main__":
+    from PyQt5 import QtWidgets as qtw
     app = qtw.QApplication(sys.argv)
     main()
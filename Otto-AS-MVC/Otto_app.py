@@ -2,14 +2,53 @@ from Otto_GUI import Ui_Form
 from PyQt5 import uic
 import sys
 from PyQt5 import QtWidgets as qtw
+from PyQt5 import QtCore as qtc
 from Otto import ottoCycleController
+from Otto_cache import ottoCycleCache
 from Air import *
+from copy import deepcopy
 
 #these imports are necessary for drawing a matplot lib graph on my GUI
 #no simple widget for this exists in QT Designer, so I have to add the widget in code.
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
 from matplotlib.figure import Figure
 
+class calcSignals(qtc.QObject):
+    # QRunnable is not a QObject, so the signals live here
+    finished = qtc.pyqtSignal(int, object)  # request number, calculated model
+    failed = qtc.pyqtSignal(int, str)  # request number, error message
+
+class calcWorker(qtc.QRunnable):
+    """
+    Calculates an Otto cycle on a thread pool thread.  The worker gets its own copy of the model and a headless
+    controller, so nothing the GUI is showing is changed until the finished signal is handled on the GUI thread.
+    """
+    def __init__(self, requestID, model, inputs, isStale, cache=None):
+        """
+        :param requestID: number of this request
+        :param model: copy of the model to calculate
+        :param inputs: keyword arguments for ottoCycleController.set
+        :param isStale: function that returns True once a newer request has been made
+        :param cache: ottoCycleCache to look the cycle up in first
+        """
+        super().__init__()
+        self.requestID=requestID
+        self.model=model
+        self.inputs=inputs
+        self.isStale=isStale
+        self.cache=cache
+        self.signals=calcSignals()
+
+    def run(self):
+        controller=ottoCycleController(model=self.model, headless=True, cache=self.cache)
+        controller.cancelled=self.isStale  # stop early if the inputs are superseded
+        try:
+            controller.set(**self.inputs)
+        except Exception as e:
+            self.signals.failed.emit(self.requestID, str(e))
+            return
+        self.signals.finished.emit(self.requestID, controller.model)  # stale results are ignored by the window
+
 class MainWindow(qtw.QWidget, Ui_Form):
     def __init__(self):
         """MainWindow constructor"""
@@ -35,6 +74,17 @@ class MainWindow(qtw.QWidget, Ui_Form):
 
         #create a otto controller object to work with later
         self.controller=ottoCycleController()
+        #cycles calculated in earlier sessions are kept on disk, so asking for one again does not recalculate it
+        try:
+            self.cache=ottoCycleCache()
+        except OSError:
+            self.cache=None  # e.g., no writable cache directory
+        #the calculations run on a worker thread so the window stays responsive
+        self.pool=qtc.QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.requestID=0  # number of the most recent calculation request
+        self.running=False  # a worker is calculating
+        self.pending=None  # the newest inputs that arrived while a worker was busy
         someWidgets=[]
         tlot=self.le_TLow.text()
         someWidgets+=[self.lbl_THigh, self.lbl_TLow, self.lbl_P0, self.lbl_V0, self.lbl_CR]
@@ -48,6 +98,17 @@ class MainWindow(qtw.QWidget, Ui_Form):
         #pass some widgets to the controller for both input and output
         self.controller.setWidgets(w=someWidgets)
 
+        #sliders for scrubbing T_High, T_Low and the compression ratio.  While a slider is dragged, a rough cycle is
+        #drawn right away and the full calculation is done once the slider rests for a moment.
+        self.sliders={}
+        self.makeSlider('THigh', self.le_THigh, row=0, low=800.0, high=4000.0, step=10.0, temperature=True)
+        self.makeSlider('TLow', self.le_TLow, row=1, low=200.0, high=600.0, step=1.0, temperature=True)
+        self.makeSlider('CR', self.le_CR, row=4, low=2.0, high=20.0, step=0.1)
+        self.refineTimer=qtc.QTimer(self)
+        self.refineTimer.setSingleShot(True)
+        self.refineTimer.setInterval(150)  # ms the slider has to rest before the full calculation
+        self.refineTimer.timeout.connect(self.calcOtto)
+
         #show the form
         self.show()
 
@@ -73,19 +134,134 @@ class MainWindow(qtw.QWidget, Ui_Form):
         except ValueError:
             return False
 
+    def makeSlider(self, name, lineEdit, row, low, high, step, temperature=False):
+        """
+        Adds a horizontal slider next to an input on the form.  Slider positions are whole numbers of steps, and
+        temperatures are in K whatever the units shown.
+        :param name: key for self.sliders
+        :param lineEdit: the QLineEdit the slider sets
+        :param row: row of the input grid layout
+        :param low: smallest value (SI units)
+        :param high: largest value (SI units)
+        :param step: value of one step of the slider (SI units)
+        :param temperature: True if the value is shown in R for english units
+        """
+        slider=qtw.QSlider(qtc.Qt.Horizontal)
+        slider.setRange(0, round((high-low)/step))
+        slider.setMinimumWidth(150)
+        self.gridLayout.addWidget(slider, row, 5, 1, 1)
+        self.sliders[name]=(slider, lineEdit, low, step, temperature)
+        self.syncSlider(name)
+        slider.valueChanged.connect(lambda pos: self.sliderMoved(name, pos))
+        slider.sliderReleased.connect(self.sliderReleased)
+
+    def syncSlider(self, name):
+        # moves a slider to the value in its line edit without triggering a calculation
+        slider, lineEdit, low, step, temperature=self.sliders[name]
+        if not self.isfloat(lineEdit.text()):
+            return
+        val=float(lineEdit.text())
+        if temperature and not self.rdo_Metric.isChecked():
+            val/=self.controller.model.units.CF_T
+        slider.blockSignals(True)
+        slider.setValue(round((val-low)/step))
+        slider.blockSignals(False)
+
+    def sliderMoved(self, name, pos):
+        """
+        Called when a slider changes.  Puts the new value in the line edit, draws a rough cycle right away and
+        (re)starts the timer for the full calculation.
+        """
+        slider, lineEdit, low, step, temperature=self.sliders[name]
+        val=low+pos*step
+        if temperature and not self.rdo_Metric.isChecked():
+            val*=self.controller.model.units.CF_T
+        lineEdit.setText('{:0.{}f}'.format(val, 1 if step < 1 else 0))
+        self.preview()
+        self.refineTimer.start()
+
+    def sliderReleased(self):
+        # no need to wait for the slider to rest
+        self.refineTimer.stop()
+        self.calcOtto()
+
+    def preview(self):
+        """
+        Draws a rough cycle for the current inputs on the GUI thread.  The states are exact, but the curves only have
+        a few points each and the axis limits are kept if the cycle fits, so this is quick enough to keep up with a
+        slider.  Any calculation still running on the worker is now stale.
+        """
+        try:
+            inputs=self.controller.getInputs()
+        except ValueError:
+            return  # an input is not a number
+        self.requestID+=1
+        self.controller.set(**inputs, preview=True)
+
     def doPlot(self):
         self.controller.updateView()
 
     def setUnits(self):
         self.controller.updateView()
+        for name in self.sliders:
+            self.syncSlider(name)  # the sliders work in SI units
 
     def calcOtto(self):
         '''
         This is called when the calculate button is clicked
+        The calculation is handed to a worker thread.  If a calculation is already running, it is told to stop and
+        only the newest inputs are calculated when it does.
         :return: nothing
         '''
         #calculate the cycle efficiency (and states 1,2,3,4)
-        self.controller.calc()
+        try:
+            inputs=self.controller.getInputs()
+        except ValueError:
+            return  # an input is not a number
+        self.requestID+=1
+        self.pending=inputs
+        self.setBusy(True)
+        self.startWorker()
+
+    def startWorker(self):
+        if self.running or self.pending is None:
+            return
+        inputs, self.pending=self.pending, None
+        requestID=self.requestID
+        worker=calcWorker(requestID, deepcopy(self.controller.model), inputs, lambda: requestID!=self.requestID,
+                          cache=self.cache)
+        worker.signals.finished.connect(self.calcFinished)
+        worker.signals.failed.connect(self.calcFailed)
+        self.running=True
+        self.pool.start(worker)
+
+    def calcFinished(self, requestID, model):
+        self.running=False
+        if requestID==self.requestID:
+            self.controller.model=model
+            self.controller.updateView()
+            for name in self.sliders:
+                self.syncSlider(name)  # in case the value was typed in
+        self.calcDone()
+
+    def calcFailed(self, requestID, message):
+        self.running=False
+        if requestID==self.requestID:
+            qtw.QMessageBox.warning(self, 'Otto Cycle Calculator', 'Calculation failed: {}'.format(message))
+        self.calcDone()
+
+    def calcDone(self):
+        if self.pending is not None:
+            self.startWorker()  # newer inputs arrived while the worker was busy
+        else:
+            self.setBusy(False)
+
+    def setBusy(self, busy):
+        # show a busy cursor while calculating
+        if busy and not qtw.QApplication.overrideCursor():
+            qtw.QApplication.setOverrideCursor(qtc.Qt.BusyCursor)
+        elif not busy:
+            qtw.QApplication.restoreOverrideCursor()
 
 #if this module is being imported, this won't run. If it is the main module, it will run.
 if __name__== '__main__':
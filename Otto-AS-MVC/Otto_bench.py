@@ -0,0 +1,211 @@
+"""
+Benchmarks for the air properties and the Otto cycle.
+
+Times air.set for each of the 12 property pairs that air.calc handles, ottoCycleController.set,
+buildDataForPlotting and plot_cycle_XY (on an off-screen Agg canvas).  For each benchmark, the calls/sec, the p50 and
+p99 latency of single calls and the peak memory allocated during a call (tracemalloc) are recorded.
+Absolute timings depend on the machine and whatever else it is doing, so every round also times a fixed calibration
+loop, and each p50 is recorded relative to the calibration p50 (p50_rel).  The results are written as JSON and
+compared against a baseline recorded on this machine (by default in the user's cache directory, never in the repo),
+and a benchmark whose p50_rel is more than --threshold above the baseline's is flagged as a regression.
+
+Examples:
+    python Otto_bench.py --save-baseline          # record a baseline on this machine (e.g., before a change)
+    python Otto_bench.py                          # run and compare against that baseline
+    python Otto_bench.py -o results.json          # also save the results
+"""
+from Air import *
+from Otto import ottoCycleController, ottoCycleView
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+baselinePath = os.path.join(userCacheDir('otto_bench'), 'baseline.json')
+
+def timeCalls(fn, minTime=0.05, minCalls=5, maxCalls=100000):
+    """
+    Calls fn repeatedly and times every call.
+    :param fn: function with no arguments
+    :param minTime: keep calling for at least this many seconds
+    :param minCalls: and at least this many times
+    :param maxCalls: but no more than this
+    :return: list of the times of the calls in seconds
+    """
+    times = []
+    clock = time.perf_counter
+    start = clock()
+    while len(times) < maxCalls and (len(times) < minCalls or clock()-start < minTime):
+        t = clock()
+        fn()
+        times.append(clock()-t)
+    return times
+
+def peakMemory(fn):
+    # peak memory allocated during a call in KiB.  This is measured separately since tracemalloc slows everything down.
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak/1024.0
+
+def summarize(rounds, peak):
+    """
+    :param rounds: list of the lists of call times from each round
+    :param peak: peak memory in KiB
+    :return: dict of calls_per_sec, p50_us, p99_us, peak_kib and calls.  p50_us is the lowest of the medians of
+             the rounds, which is much less sensitive to other load on the machine than the median of all calls.
+    """
+    times = np.concatenate(rounds)
+    return {'calls_per_sec': len(times)/times.sum(),
+            'p50_us': min(float(np.median(r)) for r in rounds)*1.0E6,
+            'p99_us': float(np.percentile(times, 99))*1.0E6,
+            'peak_kib': peak,
+            'calls': len(times)}
+
+def calibration(coefs=np.array([3.653, -1.337E-3, 3.294E-6, -1.913E-9, 0.2763E-12])):
+    # a fixed mix of Python arithmetic and small numpy calls, like the benchmarks, to measure the speed of the machine
+    T = np.linspace(300.0, 1000.0, 8)
+    x = 0.0
+    for i in range(200):
+        x += float(np.polyval(coefs, T).sum())/(i+1.0)
+    return x
+
+def airCases():
+    # the 12 property pairs of air.calc, with values from the state at 1500 K and 10 bar
+    a = air()
+    ref = a.set(T=1500.0, P=1.0E6)
+    pairs = (('P', 'T'), ('P', 'u'), ('P', 'v'), ('P', 'h'), ('P', 's'), ('T', 'v'),
+             ('T', 's'), ('u', 'v'), ('u', 's'), ('v', 'h'), ('v', 's'), ('h', 's'))
+    return {'air.set({},{})'.format(*pair): {k: ref.getVal(k) for k in pair} for pair in pairs}
+
+def runBenchmarks(minTime=0.25, rounds=5, select=None):
+    """
+    Runs the benchmarks.  The benchmarks take turns over several rounds, so a burst of other load on the machine
+    is spread over all of them instead of landing on one.
+    :param minTime: seconds to spend on each benchmark (split over the rounds)
+    :param rounds: number of rounds
+    :param select: if given, only benchmarks with one of these strings in their name are run
+    :return: dict of benchmark name to the dict from summarize, with p50_rel, the p50 relative to the calibration
+             loop, added.  'calibration' is always run.
+    """
+    benchmarks = {}
+
+    # air properties.  The cache would turn everything after the first call into a dictionary lookup.
+    a = air()
+    a.setCache(maxSize=0)
+    for name, kwargs in airCases().items():
+        benchmarks[name] = lambda kwargs=kwargs: a.set(**kwargs)
+
+    # the Otto cycle, alternating between two sets of inputs so every call recalculates everything
+    inputs = (dict(T_0=300.0, P_0=1.0E5, V_0=1.0E-3, T_High=1500.0, ratio=6.0),
+              dict(T_0=540.0, P_0=1.0, V_0=0.02, T_High=3600.0, ratio=8.0, SI=False))
+    oc = ottoCycleController(headless=True)
+    oc.model.air.setCache(maxSize=0)
+    nextInputs = itertools.cycle(inputs).__next__
+    def controllerSet():
+        oc.set(**nextInputs())
+    benchmarks['ottoCycleController.set'] = controllerSet
+    benchmarks['buildDataForPlotting'] = lambda: oc.buildDataForPlotting()
+    benchmarks['buildDataForPlotting(nPoints=30)'] = lambda: oc.buildDataForPlotting(nPoints=30)
+
+    # plotting on an off-screen canvas
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(8, 8), tight_layout=True)
+    view = ottoCycleView(widgets=False)
+    view.canvas = FigureCanvasAgg(fig)
+    view.ax = fig.add_subplot()
+    oc.set(**inputs[0])
+    nextAxes = itertools.cycle((('v', 'P'), ('s', 'T'))).__next__
+    def plotSame():
+        view.plot_cycle_XY(oc.model, X='s', Y='T', total=True)
+    def plotSwitch():
+        X, Y = nextAxes()
+        view.plot_cycle_XY(oc.model, X=X, Y=Y, total=True)
+    benchmarks['plot_cycle_XY(redraw)'] = plotSame
+    benchmarks['plot_cycle_XY(switch axes)'] = plotSwitch
+
+    if select:
+        benchmarks = {name: fn for name, fn in benchmarks.items() if any(s in name for s in select)}
+    benchmarks['calibration'] = calibration  # takes its turn in every round, so it sees the same load
+    for fn in benchmarks.values():  # warm up
+        timeCalls(fn, minTime=0.0)
+    times = {name: [] for name in benchmarks}
+    for r in range(rounds):
+        for name, fn in benchmarks.items():
+            times[name].append(timeCalls(fn, minTime=minTime/rounds))
+    results = {name: summarize(times[name], peakMemory(fn)) for name, fn in benchmarks.items()}
+    for res in results.values():
+        res['p50_rel'] = res['p50_us']/results['calibration']['p50_us']
+    return results
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Compares results against a baseline by p50_rel, so a slower or busier machine doesn't show up as a regression.
+    :return: list of (name, p50_rel now, p50_rel baseline, ratio) for the regressions
+    """
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None or 'p50_rel' not in base or name == 'calibration':
+            continue
+        ratio = res['p50_rel']/base['p50_rel']
+        if ratio > 1.0+threshold:
+            regressions.append((name, res['p50_rel'], base['p50_rel'], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks for Air.py and the Otto cycle.')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('-b', '--baseline', default=baselinePath,
+                        help='baseline JSON file to compare against (default: {})'.format(baselinePath))
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('-t', '--threshold', type=float, default=0.25,
+                        help='flag benchmarks whose p50 relative to the calibration loop is above the baseline\'s '
+                             'by more than this fraction')
+    parser.add_argument('--min-time', type=float, default=0.25, help='seconds to spend on each benchmark')
+    parser.add_argument('--rounds', type=int, default=5, help='rounds the benchmarks take turns over')
+    parser.add_argument('-k', dest='select', action='append', help='only run benchmarks with this in their name')
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(minTime=args.min_time, rounds=args.rounds, select=args.select)
+    out = {'meta': {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(), 'numpy': np.__version__,
+                    'machine': platform.machine(), 'platform': platform.platform()},
+           'results': results}
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print('{:34s} {:>12s} {:>10s} {:>10s} {:>10s} {:>9s}'.format('benchmark', 'calls/sec', 'p50 (us)', 'p99 (us)',
+                                                                   'peak (KiB)', 'vs base'))
+    for name, res in results.items():
+        vs = ''
+        if baseline is not None and 'p50_rel' in baseline.get(name, {}):
+            vs = '{:0.2f}x'.format(res['p50_rel']/baseline[name]['p50_rel'])
+        print('{:34s} {:12.1f} {:10.1f} {:10.1f} {:10.1f} {:>9s}'.format(name, res['calls_per_sec'], res['p50_us'],
+                                                                         res['p99_us'], res['peak_kib'], vs))
+    for path in ([args.output] if args.output else []) + ([args.baseline] if args.save_baseline else []):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(out, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, now, base, ratio in regressions:
+            print('REGRESSION {}: p50 {:0.4g} vs {:0.4g} calibration loops in the baseline ({:0.2f}x)'.format(
+                name, now, base, ratio))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+from Air import *
+from Instrument import probe
+import hashlib
+import numpy as np
+import os
+import tempfile
+import time
+import zipfile
+
+class ottoCycleCache():
+    """
+    A persistent store of calculated Otto cycles:  a directory with one NPZ file per cycle, so results survive from
+    one session to the next.  The file name is a hash of the inputs (T_0, P_0, V_0, T_High, ratio in SI units) and
+    the version of the air model (see air.getModelVersion), so changing the air constants or the property method
+    never finds results calculated with the old ones.
+    Each file holds the four states, the energies, the moles of air and the upper and lower curves.  Files are
+    written to a temporary name and then renamed, so another process never reads a half written file.
+    When the files take up more than maxBytes (or there are more than maxEntries), the least recently used ones are
+    deleted.  The modification time of a file is updated when it is read, so it records the last use.  A file that
+    can't be read (cut short by a crash, say) is deleted and counted as a miss, and temporary files left behind by
+    interrupted writes are deleted by evict once they are older than tmpAge.
+    Usage:
+        controller.cache = ottoCycleCache()  # ottoCycleController.set looks here before calculating anything
+    """
+    stateColumns = ('T', 'P', 'u', 'h', 's', 'v')
+    stateNames = ('State 1 - BDC', 'State 2 - TDC', 'State 3 - TDC', 'State 4 - BDC')
+    energyColumns = ('W_Compression', 'W_Power', 'Q_In', 'Q_Out', 'W_Cycle', 'Eff')
+    tmpAge = 600.0  # seconds before a temporary file is taken to be left over from an interrupted write
+
+    def __init__(self, path=None, maxBytes=64*1024**2, maxEntries=10000):
+        """
+        :param path: directory for the files (made if needed).  The default is otto_cycles in the user's cache
+                     directory (XDG_CACHE_HOME or ~/.cache).
+        :param maxBytes: the most disk space the files may use
+        :param maxEntries: the most cycles to keep
+        """
+        if path is None:
+            path = userCacheDir('otto_cycles')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.maxBytes = maxBytes
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def getKey(self, model):
+        """
+        The canonical hash of the inputs of a model.  The inputs are written with repr, which gives the same text
+        for the same float on every platform.
+        :param model: an ottoCycleModel
+        :return: hex string
+        """
+        inputs = (model.T_initial, model.p_initial, model.V_Cylinder, model.T_high, model.Ratio)
+        text = ','.join(repr(float(x)) for x in inputs) + ';' + model.air.getModelVersion()
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def getFile(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def load(self, model):
+        """
+        Looks for the cycle with the inputs of model and, if it is found, puts the stored results in the model.
+        :param model: an ottoCycleModel with its inputs set
+        :return: True if the cycle was found
+        """
+        fname = self.getFile(self.getKey(model))
+        try:
+            with np.load(fname) as f:
+                states, energies, n, upper, lower = f['states'], f['energies'], float(f['n']), f['upper'], f['lower']
+            os.utime(fname)  # mark it as recently used
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile) as e:
+            if not isinstance(e, FileNotFoundError):  # unreadable (truncated or corrupt), so don't find it again
+                self.remove(fname)
+            self.misses += 1
+            if probe.enabled:
+                probe.count('cycle cache misses')
+            return False
+        self.hits += 1
+        if probe.enabled:
+            probe.count('cycle cache hits')
+        for i, name in enumerate(self.stateNames):
+            setattr(model, 'State{}'.format(i+1),
+                    stateProps(name=name, **{w: float(x) for w, x in zip(self.stateColumns, states[i])}))
+        for col, val in zip(self.energyColumns, energies):
+            setattr(model, col, float(val))
+        model.n = n
+        model.m = n*model.air.MW
+        model.upperCurve = StateDataForPlotting(capacity=upper.shape[1])
+        model.upperCurve.addMany(upper)
+        model.lowerCurve = StateDataForPlotting(capacity=lower.shape[1])
+        model.lowerCurve.addMany(lower)
+        return True
+
+    def save(self, model):
+        """
+        Stores the results of a fully calculated model and then evicts the least recently used files if the cache
+        is over its limits.
+        :param model: an ottoCycleModel with nothing left out of date
+        :return: none
+        """
+        states = np.array([[st.getVal(w) for w in self.stateColumns]
+                           for st in (model.State1, model.State2, model.State3, model.State4)])
+        energies = np.array([getattr(model, col) for col in self.energyColumns])
+        upper = model.upperCurve.data[:, :len(model.upperCurve)]
+        lower = model.lowerCurve.data[:, :len(model.lowerCurve)]
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, states=states, energies=energies, n=model.n, upper=upper, lower=lower)
+            os.replace(tmp, self.getFile(self.getKey(model)))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return  # a full disk (or the like) just means the cycle is not cached
+        self.evict()
+
+    def remove(self, fname):
+        try:
+            os.remove(fname)
+        except OSError:
+            pass  # another process got to it first
+
+    def getEntries(self, suffix='.npz'):
+        # list of (last used, size, file name) for the files in the cache, oldest first
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.endswith(suffix):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        return sorted(entries)
+
+    def evict(self):
+        # temporary files left by writes that were interrupted are deleted once they are older than tmpAge seconds
+        # (a younger one may be another process part way through save).  They count toward maxBytes until then.
+        stale = time.time() - self.tmpAge
+        temps = self.getEntries('.tmp')
+        for mtime, nbytes, fname in temps:
+            if mtime < stale:
+                self.remove(fname)
+                self.evictions += 1
+        entries = self.getEntries()
+        size = sum(e[1] for e in entries) + sum(e[1] for e in temps if e[0] >= stale)
+        while entries and (size > self.maxBytes or len(entries) > self.maxEntries):
+            mtime, nbytes, fname = entries.pop(0)
+            self.remove(fname)
+            size -= nbytes
+            self.evictions += 1
+
+    def clear(self):
+        # deletes every cached cycle, along with any temporary files
+        for mtime, nbytes, fname in self.getEntries() + self.getEntries('.tmp'):
+            self.remove(fname)
+
+    def getInfo(self):
+        """
+        :return: a dictionary of the hit, miss and eviction counts of this session along with the number of files
+                 and the disk space they use (temporary files included)
+        """
+        entries = self.getEntries()
+        temps = self.getEntries('.tmp')
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(entries),
+                'bytes': sum(e[1] for e in entries + temps), 'tmpFiles': len(temps),
+                'maxBytes': self.maxBytes, 'maxEntries': self.maxEntries}
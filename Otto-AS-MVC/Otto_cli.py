@@ -0,0 +1,246 @@
+"""
+Command line Otto cycle calculator.  No Qt widgets are made, so this runs on machines without a display.
+
+Reads rows of T_0, P_0, V_0, T_High, ratio, units from a CSV file (or stdin) with a header line and writes a row of
+results for each to CSV (or stdout) or NPZ.  The inputs are in the units of the row (SI: K, Pa, m^3 or english:
+R, atm, ft^3), and the results are in SI units:  states 1-4 (T, P, u, h, s, v on a molar basis), the energies
+(J/mol), the efficiency (%) and the moles of air in the cylinder (n).  The rows are read and calculated a block at
+a time, so memory use does not grow with the number of rows.
+
+Examples:
+    python Otto_cli.py cases.csv > results.csv
+    cat cases.csv | python Otto_cli.py -o results.npz
+"""
+from Air import *
+from Otto_sweep import calcCycles, ottoSweepResults
+from collections import deque
+import argparse
+import codecs
+import csv
+import io
+import numpy as np
+import os
+import select
+import stat
+import sys
+import tempfile
+import zipfile
+
+inputColumns = ('T_0', 'P_0', 'V_0', 'T_High', 'ratio')
+outputColumns = ottoSweepResults.columns + ('n',)
+
+def isStream(f):
+    # True if f is a pipe, socket or terminal, i.e., more rows may come later rather than being there already
+    try:
+        return not stat.S_ISREG(os.fstat(f.fileno()).st_mode)
+    except (OSError, ValueError, io.UnsupportedOperation):  # no file descriptor (e.g., StringIO)
+        return False
+
+class lineReader():
+    """
+    The lines of a pipe or terminal, read straight from its file descriptor.  Unlike a text file, nothing is held
+    in a buffer out of sight:  the only lines read ahead are the ones kept here, so isStalled can tell when every
+    row that has arrived has been used and the writer has stopped.  f must not have been read from before.
+    """
+    def __init__(self, f):
+        self.fd = f.fileno()
+        self.decoder = codecs.getincrementaldecoder(getattr(f, 'encoding', None) or 'utf-8')()
+        self.lines = deque()
+        self.partial = ''  # the start of a line whose end hasn't arrived yet
+        self.eof = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self.lines:
+            if self.eof:
+                raise StopIteration
+            self.fill()
+        return self.lines.popleft()
+
+    def fill(self):
+        # waits for whatever the writer sends next
+        data = os.read(self.fd, 1 << 16)
+        text = self.partial + self.decoder.decode(data, final=not data)
+        if not data:
+            self.eof = True
+            self.partial = ''
+            if text:
+                self.lines.append(text)
+            return
+        lines = text.split('\n')
+        self.partial = lines.pop()
+        self.lines.extend(line + '\n' for line in lines)
+
+    def isStalled(self):
+        # True if every line that has arrived has been used and nothing more can be read right now
+        if self.lines or self.eof:
+            return False
+        try:
+            return not select.select([self.fd], [], [], 0)[0]
+        except (OSError, ValueError):  # select can't wait on pipes on Windows
+            return False
+
+def readBlocks(f, blockSize=4096):
+    """
+    Reads the input rows a block at a time.  Blank lines are skipped, units is optional (SI if missing) and may be
+    SI, metric, english or imperial.  A row that can't be read gives nan inputs and a message on stderr.
+    When f is a pipe or terminal, a partial block is handed on once every row that has arrived is in it and the
+    input has stopped, so results come out while the writer is still sending (or waiting for them), not only when a
+    block fills.
+    :param f: a text file with a header line
+    :param blockSize: number of rows per block
+    :return: a generator of (inputs, SI) where inputs is an array of shape (len(inputColumns), m) and SI is a boolean
+             array.  The header is checked right away.
+    """
+    source = lineReader(f) if isStream(f) else None
+    reader = csv.reader(f if source is None else source)
+    header = [h.strip() for h in next(reader, [])]
+    missing = [c for c in inputColumns if c not in header]
+    if missing:
+        raise ValueError('input is missing column(s): {}'.format(', '.join(missing)))
+    cols = [header.index(c) for c in inputColumns]
+    unitsCol = header.index('units') if 'units' in header else None
+
+    def blocks():
+        inputs = np.empty((len(inputColumns), blockSize))
+        SI = np.empty(blockSize, dtype=bool)
+        m = 0
+        for row in reader:
+            if not any(field.strip() for field in row):
+                continue
+            try:
+                inputs[:, m] = [float(row[c]) for c in cols]
+                u = row[unitsCol].strip().lower() if unitsCol is not None and unitsCol < len(row) else ''
+                if u not in ('', 'si', 'metric', 'english', 'imperial'):
+                    raise ValueError('unknown units {}'.format(row[unitsCol]))
+                SI[m] = u not in ('english', 'imperial')
+            except (ValueError, IndexError):
+                print('line {}: could not read {}'.format(reader.line_num, ','.join(row)), file=sys.stderr)
+                inputs[:, m] = np.nan
+                SI[m] = True
+            m += 1
+            if m == blockSize:
+                yield inputs, SI
+                m = 0
+            elif source is not None and source.isStalled():
+                yield inputs[:, :m], SI[:m]
+                m = 0
+        if m > 0:
+            yield inputs[:, :m], SI[:m]
+    return blocks()
+
+def calcBlock(Air, inputs, SI):
+    """
+    Calculates the cycles for a block of input rows.
+    :param Air: the air object to use
+    :param inputs: array of shape (len(inputColumns), m) in the units of each row
+    :param SI: boolean array for the units of each row
+    :return: array of shape (len(outputColumns), m) in SI units (nan for rows that could not be read)
+    """
+    U = units()
+    out = np.full((len(outputColumns), inputs.shape[1]), np.nan)
+    ok = ~np.isnan(inputs).any(axis=0)  # rows that could not be read are left out of the temperature solves
+    if not ok.any():
+        return out
+    T_0, P_0, V_0, T_High, ratio = inputs[:, ok]
+    # conversion vectors (T, P, u, h, s, v) for each row, with v the volume of one mole
+    CF = np.where(SI[ok], U.getFactors(SI=True, total=True)[:, None], U.getFactors(SI=False, total=True)[:, None])
+    T_0, T_High = T_0/CF[0], T_High/CF[0]
+    P_0 = P_0/CF[1]
+    V_0 = V_0/CF[5]
+    with np.errstate(invalid='ignore'):  # rows that were read but make no sense (e.g., a negative ratio) give nan
+        out[:-1, ok] = calcCycles(Air, ratio, T_High, T_0, P_0)
+    out[-1, ok] = V_0/out[outputColumns.index('v1'), ok]  # moles of air
+    return out
+
+class csvWriter():
+    # writes the inputs and results to a CSV file a block at a time
+    def __init__(self, f):
+        self.f = f
+        self.f.write(','.join(inputColumns + ('units',) + outputColumns) + '\n')
+        self.rowFormat = ','.join(['%.12g']*len(inputColumns) + ['%s'] + ['%.12g']*len(outputColumns)) + '\n'
+
+    def write(self, inputs, SI, out):
+        rows = np.vstack((inputs, out)).T.tolist()
+        k = len(inputColumns)
+        self.f.write(''.join(self.rowFormat % tuple(row[:k] + ['SI' if si else 'english'] + row[k:])
+                             for si, row in zip(SI.tolist(), rows)))
+        self.f.flush()  # whoever reads the output sees each block as soon as it is done
+
+    def close(self):
+        if self.f is sys.stdout:
+            self.f.flush()
+        else:
+            self.f.close()
+
+class npzWriter():
+    """
+    Writes the inputs and results to an NPZ file with one array per column (units is stored as the boolean SI).
+    Each column is appended to its own temporary file while calculating, and then copied into the zip archive
+    behind a .npy header, so the whole table is never held in memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.names = inputColumns + ('SI',) + outputColumns
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.files = [open(os.path.join(self.tmpdir.name, name), 'wb') for name in self.names]
+        self.n = 0
+
+    def write(self, inputs, SI, out):
+        for f, col in zip(self.files, list(inputs) + [SI] + list(out)):
+            f.write(np.ascontiguousarray(col).tobytes())
+        self.n += len(SI)
+
+    def close(self):
+        with zipfile.ZipFile(self.path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for f, name in zip(self.files, self.names):
+                f.close()
+                dtype = np.dtype(bool) if name == 'SI' else np.dtype(float)
+                with zf.open(name + '.npy', 'w', force_zip64=True) as entry:
+                    np.lib.format.write_array_header_1_0(entry, {'descr': np.lib.format.dtype_to_descr(dtype),
+                                                                 'fortran_order': False, 'shape': (self.n,)})
+                    with open(f.name, 'rb') as src:
+                        while True:
+                            buf = src.read(1 << 20)
+                            if not buf:
+                                break
+                            entry.write(buf)
+        self.tmpdir.cleanup()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Calculate Otto cycles from a CSV file of inputs.',
+                                     epilog='input columns: {}, units (optional)'.format(', '.join(inputColumns)))
+    parser.add_argument('input', nargs='?', default='-', help='CSV file of inputs (default: stdin)')
+    parser.add_argument('-o', '--output', default='-', help='output .csv or .npz file (default: CSV to stdout)')
+    parser.add_argument('-b', '--block-size', type=int, default=4096, help='rows calculated at a time')
+    parser.add_argument('--method', default='analytic', choices=('analytic', 'quad', 'table'),
+                        help='air property method')
+    args = parser.parse_args(argv)
+
+    Air = air()
+    Air.setPropertyMethod(args.method)
+    fin = sys.stdin if args.input == '-' else open(args.input, newline='')
+    try:
+        blocks = readBlocks(fin, args.block_size)
+        if args.output.lower().endswith('.npz'):
+            writer = npzWriter(args.output)
+        else:
+            writer = csvWriter(sys.stdout if args.output == '-' else open(args.output, 'w', newline=''))
+        for inputs, SI in blocks:
+            writer.write(inputs, SI, calcBlock(Air, inputs, SI))
+        writer.close()
+    except BrokenPipeError:
+        sys.stderr.close()  # e.g., piped into head
+        return 1
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+from Air import *
+from Cycles import calcCycle
+import numpy as np
+import os
+import time
+
+class ottoSweepResults():
+    """
+    Results of an Otto cycle sweep.  Every array has the shape of the grid, i.e., (len(ratio), len(T_High),
+    len(T_0), len(P_0)), and element [i,j,k,l] is the cycle for ratio[i], T_High[j], T_0[k] and P_0[l].
+    States and energies are molar in SI units (K, Pa, J/mol, J/mol*K, m^3/mol), as in ottoCycleModel.
+    """
+    columns = tuple('{}{}'.format(c, i) for i in range(1, 5) for c in ('T', 'P', 'u', 'h', 's', 'v')) + \
+              ('W_Compression', 'W_Power', 'Q_In', 'Q_Out', 'W_Cycle', 'Eff')
+
+    def __init__(self, ratio, T_High, T_0, P_0, data):
+        """
+        :param ratio, T_High, T_0, P_0: the axes of the grid (1D arrays, SI units)
+        :param data: array of shape (len(columns),) + grid shape
+        """
+        self.ratio = ratio
+        self.T_High = T_High
+        self.T_0 = T_0
+        self.P_0 = P_0
+        self.data = data
+        for i, col in enumerate(self.columns[24:]):
+            setattr(self, col, data[24+i])
+        self.State1, self.State2, self.State3, self.State4 = [self.getState(i) for i in range(1, 5)]
+
+    @property
+    def shape(self):
+        return self.data.shape[1:]
+
+    def getState(self, i):
+        # returns state i (1-4) of every cycle as a StateArray
+        T, P, u, h, s, v = self.data[6*(i-1):6*i]
+        return StateArray(T=T, P=P, u=u, h=h, s=s, v=v, name='State {}'.format(i))
+
+    def getCol(self, name):
+        # returns one column by name (e.g., 'Eff' or 'T3')
+        return self.data[self.columns.index(name)]
+
+_air = None  # each worker process makes its own air object the first time it evaluates a chunk
+
+def calcChunk(axes, start, stop, propertyMethod='analytic'):
+    """
+    Evaluates the cycles with flat (C order) grid indices start to stop-1.
+    This is a module level function so it can be sent to worker processes.
+    :param axes: (ratio, T_High, T_0, P_0) axes of the grid in SI units
+    :param start: first flat index
+    :param stop: one past the last flat index
+    :param propertyMethod: air property method (see air.setPropertyMethod)
+    :return: array of shape (len(ottoSweepResults.columns), stop-start)
+    """
+    global _air
+    if _air is None:
+        _air = air()
+    if _air.propertyMethod != propertyMethod:
+        _air.setPropertyMethod(propertyMethod)
+    i, j, k, l = np.unravel_index(np.arange(start, stop), tuple(len(a) for a in axes))
+    return calcCycles(_air, axes[0][i], axes[1][j], axes[2][k], axes[3][l])
+
+def calcCycles(Air, ratio, T_High, T_0, P_0):
+    """
+    Evaluates many cycles at once with the Otto cycle of Cycles.py, so the states are found the same way as in
+    calcCycle and ottoCycleModel.calcNode.
+    :param Air: the air object to use
+    :param ratio, T_High, T_0, P_0: arrays (or scalars) of the inputs in SI units that broadcast together
+    :return: array of shape (len(ottoSweepResults.columns),) + broadcast shape of the inputs
+    """
+    res = calcCycle('Otto', T_0, P_0, Air=Air, nPoints=0, ratio=ratio, T_High=T_High)
+    # the processes are 1-2 compression, 2-3 heat addition, 3-4 power stroke and 4-1 heat rejection
+    W_Compression = -res.W[0]
+    W_Power = res.W[2]
+    Q_In = res.Q[1]
+    Q_Out = -res.Q[3]
+    W_Cycle = W_Power - W_Compression
+    Eff = 100.0*W_Cycle/Q_In
+
+    out = np.empty((len(ottoSweepResults.columns),)+res.shape)
+    for n, st in enumerate(res.states):
+        out[6*n:6*n+6] = (st.T, st.P, st.u, st.h, st.s, st.v)
+    out[24:] = (W_Compression, W_Power, Q_In, Q_Out, W_Cycle, Eff)
+    return out
+
+def sweep(ratio, T_High, T_0, P_0, SI=True, workers=None, chunkSize=20000, propertyMethod='analytic'):
+    """
+    Evaluates the Otto cycle for every combination of the inputs.  The grid is split into chunks of chunkSize
+    cycles, and the chunks are handed to a pool of worker processes.  Only the grid axes and index ranges are sent
+    to the workers, and each chunk comes back as one array that is copied into its place in the results.
+    :param ratio: compression ratios (scalar or 1D array)
+    :param T_High: high temperatures in (R or K)
+    :param T_0: initial temperatures in (R or K)
+    :param P_0: initial pressures in (atm or Pa)
+    :param SI: boolean for the units of the inputs (the results are always SI)
+    :param workers: number of worker processes (None for one per cpu, 0 or 1 to calculate in this process)
+    :param chunkSize: number of cycles per task
+    :param propertyMethod: air property method (see air.setPropertyMethod)
+    :return: ottoSweepResults
+    """
+    CF_T, CF_P = units().getFactors(SI=SI)[:2]
+    axes = (np.atleast_1d(np.asarray(ratio, dtype=float)).ravel(),
+            np.atleast_1d(np.asarray(T_High, dtype=float)).ravel()/CF_T,
+            np.atleast_1d(np.asarray(T_0, dtype=float)).ravel()/CF_T,
+            np.atleast_1d(np.asarray(P_0, dtype=float)).ravel()/CF_P)
+    shape = tuple(len(a) for a in axes)
+    N = int(np.prod(shape))
+    data = np.empty((len(ottoSweepResults.columns), N))
+    bounds = [(start, min(start+chunkSize, N)) for start in range(0, N, chunkSize)]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(bounds))
+    if propertyMethod == 'table':
+        airPropertyTable.get(air())  # writes the table file once here, and the workers all memory map it
+    if workers <= 1:
+        for start, stop in bounds:
+            data[:, start:stop] = calcChunk(axes, start, stop, propertyMethod)
+    else:
+        from concurrent.futures import ProcessPoolExecutor  # only needed here, and it pulls in multiprocessing
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            n = len(bounds)
+            chunks = pool.map(calcChunk, [axes]*n, [b[0] for b in bounds], [b[1] for b in bounds], [propertyMethod]*n)
+            for (start, stop), chunk in zip(bounds, chunks):
+                data[:, start:stop] = chunk
+    return ottoSweepResults(*axes, data.reshape((len(ottoSweepResults.columns),)+shape))
+
+def main():
+    t = time.perf_counter()
+    res = sweep(ratio=np.linspace(4.0, 16.0, 25), T_High=np.linspace(1200.0, 3000.0, 37),
+                T_0=np.linspace(280.0, 320.0, 9), P_0=np.linspace(80.0E3, 120.0E3, 9))
+    t = time.perf_counter()-t
+    print('{} cycles in {:0.2f} s'.format(res.Eff.size, t))
+    print('Efficiency (%) at T_0={:0.1f} K, P_0={:0.0f} Pa'.format(res.T_0[4], res.P_0[4]))
+    print('   r  ' + ''.join('{:>9.0f}'.format(T) for T in res.T_High[::6]))
+    for i in range(0, len(res.ratio), 4):
+        print('{:5.1f} '.format(res.ratio[i]) + ''.join('{:9.3f}'.format(e) for e in res.Eff[i, ::6, 4, 4]))
+
+if __name__ == '__main__':
+    main()